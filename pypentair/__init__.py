@@ -1,7 +1,9 @@
 """pypentair module."""
 from .exceptions import PentairApiException, PentairAuthenticationError
+from .hedge import HedgePolicy
+from .journal import DeviceJournal
 from .pentair import Pentair, PentairDevice, PentairIF3Pump, PentairIF3PumpProgram, PentairSaltLevelSensor, PentairSumpPumpBatteryBackup
 
-__all__ = ["Pentair", "PentairApiException", "PentairAuthenticationError", "PentairDevice", "PentairIF3Pump", "PentairIF3PumpProgram",
+__all__ = ["DeviceJournal", "HedgePolicy", "Pentair", "PentairApiException", "PentairAuthenticationError", "PentairDevice", "PentairIF3Pump", "PentairIF3PumpProgram",
           "PentairSaltLevelSensor", "PentairSumpPumpBatteryBackup" ]
 __version__ = "0.0.1"
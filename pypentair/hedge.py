@@ -0,0 +1,70 @@
+"""Request hedging."""
+from __future__ import annotations
+
+from collections import deque
+from threading import Lock
+
+
+class HedgePolicy:
+    """Decide when to send a hedged (duplicate) request.
+
+    Latencies of recent requests are tracked in a sliding window. Once enough
+    samples have been observed, a hedge is fired for a request that is still
+    outstanding after the configured latency percentile. The share of recent
+    calls that were hedged is capped at `max_rate`; each call reserves a hedge
+    with `acquire` and reports whether it used one with `complete`.
+    """
+
+    def __init__(
+        self,
+        *,
+        percentile: float = 95,
+        max_rate: float = 0.1,
+        min_samples: int = 20,
+        window: int = 100,
+    ) -> None:
+        """Initialize."""
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if not 0 <= max_rate <= 1:
+            raise ValueError("max_rate must be between 0 and 1")
+        if min_samples < 1 or window < min_samples:
+            raise ValueError("window must be at least min_samples, which must be positive")
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._hedged: deque[bool] = deque(maxlen=window)
+        self._pending = 0
+        self._lock = Lock()
+
+    @property
+    def delay(self) -> float | None:
+        """Return how long to wait before hedging, or None if not enough samples."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def acquire(self) -> bool:
+        """Reserve a hedge if the hedge rate cap allows it."""
+        with self._lock:
+            hedges = sum(self._hedged) + self._pending + 1
+            if hedges > self.max_rate * max(len(self._hedged), 1):
+                return False
+            self._pending += 1
+            return True
+
+    def record(self, latency: float) -> None:
+        """Record the observed latency of a request."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def complete(self, hedged: bool) -> None:
+        """Finish a call, consuming the hedge reserved by `acquire` if one was sent."""
+        with self._lock:
+            hedged = hedged and self._pending > 0
+            self._hedged.append(hedged)
+            self._pending -= hedged
@@ -0,0 +1,281 @@
+"""Device state journal."""
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from inspect import signature
+from pathlib import Path
+from threading import Lock
+from typing import Any, BinaryIO, Final
+
+from .pentair import (
+    PentairDevice,
+    PentairIF3Pump,
+    PentairIF3PumpProgram,
+    PentairSaltLevelSensor,
+    PentairSumpPumpBatteryBackup,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+_LOGGER = logging.getLogger(__name__)
+
+JOURNAL_VERSION: Final = 1
+
+DEVICE_TYPES: Final[dict[str, type[PentairDevice]]] = {
+    cls.__name__: cls
+    for cls in (
+        PentairDevice,
+        PentairIF3Pump,
+        PentairSaltLevelSensor,
+        PentairSumpPumpBatteryBackup,
+    )
+}
+
+# The fields of each device type are the parameters of its constructor
+DEVICE_FIELDS: Final[dict[str, tuple[str, ...]]] = {
+    name: tuple(signature(cls.__init__).parameters)[1:]
+    for name, cls in DEVICE_TYPES.items()
+}
+
+
+class DeviceJournal:
+    """Append-only on-disk journal of device snapshots.
+
+    Each line of the journal file is a compact JSON record of one decoded
+    device, keyed by `deviceId` and `lastReport`. The latest snapshot per
+    device is kept in memory; history is read back through a memory map.
+    Every `compact_every` appends the file is rewritten without duplicate
+    snapshots or snapshots older than `retention`, keeping the latest
+    snapshot of each device.
+
+    Appends and compaction hold an advisory lock on a `.lock` file next to the
+    journal, so several writers may share one journal on platforms with
+    `fcntl`; elsewhere only a single writer is safe. Reading never takes the
+    lock or modifies the file, and an unterminated last record is skipped.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        compact_every: int = 1000,
+        retention: timedelta | None = timedelta(days=30),
+    ) -> None:
+        """Initialize and load the latest snapshot of each device.
+
+        Pass `retention=None` to keep every snapshot.
+        """
+        self.path = Path(path)
+        self.compact_every = compact_every
+        self.retention = retention
+        self._appends = 0
+        self._lock = Lock()
+        snapshots: dict[str, list[tuple[float, dict[str, Any]]]] = {}
+        for report, device_id, record in self._read():
+            snapshots.setdefault(device_id, []).append((report, record))
+        self._latest: dict[str, tuple[float, PentairDevice]] = {}
+        for device_id, records in snapshots.items():
+            # Fall back to an older snapshot if the newest cannot be decoded
+            for report, record in sorted(records, key=lambda item: item[0], reverse=True):
+                if (device := _try_decode(record)) is not None:
+                    self._latest[device_id] = (report, device)
+                    break
+
+    def append(self, device: PentairDevice) -> bool:
+        """Append a snapshot, returning False if it is not newer than the latest."""
+        if DEVICE_TYPES.get(type(device).__name__) is not type(device):
+            raise TypeError(f"Cannot journal device of type {type(device).__name__}")
+        record = _encode(device)
+        report = _timestamp(device.lastReport)
+        with self._lock:
+            if (latest := self._latest.get(device.deviceId)) and latest[0] >= report:
+                return False
+            with self._file_lock(), self.path.open("a+b") as file:
+                _write_record(file, record)
+            self._latest[device.deviceId] = (report, device)
+            self._appends += 1
+            if self.compact_every and self._appends >= self.compact_every:
+                self._compact()
+        return True
+
+    def latest(self) -> dict[str, PentairDevice]:
+        """Return the latest snapshot of each device."""
+        with self._lock:
+            return {device_id: device for device_id, (_, device) in self._latest.items()}
+
+    def get(self, deviceId: str) -> PentairDevice | None:
+        """Return the latest snapshot of a device."""
+        with self._lock:
+            latest = self._latest.get(deviceId)
+        return latest[1] if latest else None
+
+    def between(
+        self, start: datetime, end: datetime, deviceId: str | None = None
+    ) -> list[PentairDevice]:
+        """Return snapshots reported in [start, end), oldest first.
+
+        This scans the whole journal, but only snapshots in range are decoded.
+        """
+        first, last = start.timestamp(), end.timestamp()
+        snapshots = [
+            (report, record)
+            for report, device_id, record in self._read()
+            if first <= report < last and (deviceId is None or device_id == deviceId)
+        ]
+        snapshots.sort(key=lambda item: item[0])
+        return [
+            device
+            for _, record in snapshots
+            if (device := _try_decode(record)) is not None
+        ]
+
+    def compact(self) -> None:
+        """Rewrite the journal without duplicate or expired snapshots."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the journal if anything would be dropped; the lock must be held."""
+        self._appends = 0
+        cutoff = (
+            float("-inf")
+            if self.retention is None
+            else datetime.now(timezone.utc).timestamp() - self.retention.total_seconds()
+        )
+        with self._file_lock():
+            snapshots = list(self._read())
+            latest: dict[str, float] = {}
+            for report, device_id, _ in snapshots:
+                latest[device_id] = max(report, latest.get(device_id, report))
+            seen: set[tuple[str, float]] = set()
+            records = []
+            for report, device_id, record in snapshots:
+                key = (device_id, report)
+                if key in seen or (report < cutoff and report != latest[device_id]):
+                    continue
+                seen.add(key)
+                records.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            if len(records) == len(snapshots):
+                return
+            temp = self.path.with_name(self.path.name + ".tmp")
+            with temp.open("wb") as file:
+                file.writelines(records)
+            os.replace(temp, self.path)
+        _LOGGER.debug("Compacted %s from %s to %s snapshots", self.path, len(snapshots), len(records))
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the advisory writer lock shared with other journal instances."""
+        if fcntl is None:
+            yield
+            return
+        with self.path.with_name(self.path.name + ".lock").open("ab") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> Iterator[tuple[float, str, dict[str, Any]]]:
+        """Yield the report time, deviceId and raw record of every snapshot."""
+        try:
+            file = self.path.open("rb")
+        except FileNotFoundError:
+            return
+        with file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for line in iter(view.readline, b""):
+                    if not line.endswith(b"\n"):
+                        # Torn by a crash, or still being written by another writer
+                        _LOGGER.debug("Skipping unterminated journal record in %s", self.path)
+                        continue
+                    try:
+                        record = json.loads(line)
+                        report = float(record["fields"]["lastReport"])
+                        device_id = record["fields"]["deviceId"]
+                    except (ValueError, KeyError, TypeError) as err:
+                        _LOGGER.warning("Skipping unreadable journal record: %s", err)
+                        continue
+                    yield report, device_id, record
+
+
+def _write_record(file: BinaryIO, record: bytes) -> None:
+    """Append a record, first dropping any unterminated record at the end.
+
+    The writer lock must be held. If the write fails part-way the file is
+    truncated back, so a partial line never merges with the next record.
+    """
+    if (end := file.seek(0, os.SEEK_END)) > 0:
+        file.seek(end - 1)
+        if file.read(1) != b"\n":
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                end = view.rfind(b"\n") + 1
+            _LOGGER.warning("Dropping unterminated record at the end of %s", file.name)
+            file.truncate(end)
+    try:
+        file.write(record)
+        file.flush()
+    except OSError:
+        file.truncate(end)
+        raise
+
+
+def _timestamp(value: Any) -> float:
+    """Return a lastReport value as seconds since the epoch."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    value = float(value)
+    return value / 1000 if value > datetime.now(timezone.utc).timestamp() else value
+
+
+def _encode(device: PentairDevice) -> bytes:
+    """Encode a device as a journal record."""
+    name = type(device).__name__
+    fields: dict[str, Any] = {field: getattr(device, field) for field in DEVICE_FIELDS[name]}
+    fields["lastReport"] = _timestamp(device.lastReport)
+    if isinstance(device, PentairIF3Pump):
+        fields["enabledPrograms"] = [
+            {"id": program.id, "name": program.name}
+            for program in device.enabledPrograms
+        ]
+    record = {"v": JOURNAL_VERSION, "type": name, "fields": fields}
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def _decode(record: dict[str, Any]) -> PentairDevice:
+    """Decode a journal record."""
+    if (version := record.get("v")) != JOURNAL_VERSION:
+        raise ValueError(f"unsupported journal record version {version}")
+    name = record["type"]
+    cls = DEVICE_TYPES[name]
+    fields = {
+        field: value
+        for field, value in record["fields"].items()
+        if field in DEVICE_FIELDS[name]
+    }
+    fields["lastReport"] = datetime.fromtimestamp(fields["lastReport"], timezone.utc)
+    if cls is PentairIF3Pump:
+        fields["enabledPrograms"] = [
+            PentairIF3PumpProgram(**program) for program in fields["enabledPrograms"]
+        ]
+    return cls(**fields)
+
+
+def _try_decode(record: dict[str, Any]) -> PentairDevice | None:
+    """Decode a journal record, or return None if it cannot be decoded."""
+    try:
+        return _decode(record)
+    except (ValueError, KeyError, TypeError) as err:
+        _LOGGER.warning("Skipping unreadable journal record: %s", err)
+        return None
@@ -1,11 +1,13 @@
 """Pentair account."""
 from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from datetime import datetime, timezone
-from time import time
+from threading import Thread
+from time import monotonic, time
 from typing import List
 
 import logging
-from typing import Any, Final
+from typing import TYPE_CHECKING, Any, Final
 from urllib.parse import urljoin
 
 import requests
@@ -18,12 +20,18 @@ from pycognito import Cognito
 
 from .const import CLIENT_ID, IDENTITY_POOL_ID, REGION_NAME, USER_POOL_ID
 from .exceptions import PentairAuthenticationError
+from .hedge import HedgePolicy
 from .utils import decode, redact
 import json as jsonLib
 
+if TYPE_CHECKING:
+    from .journal import DeviceJournal
+
 _LOGGER = logging.getLogger(__name__)
 
 BASE_URL: Final = "https://api.pentair.cloud/"
+DEFAULT_GET_TIMEOUT: Final = 10
+DEFAULT_PUT_TIMEOUT: Final = 30
 
 class PentairDevice:
     def __init__(self, deviceId: int, nickName: str, deviceType: str, maker: str, model: str, softwareVersion: str, lastReport: datetime):
@@ -87,12 +95,27 @@ class Pentair:
         access_token: str | None = None,
         id_token: str | None = None,
         refresh_token: str | None = None,
+        hedge_policy: HedgePolicy | None = None,
+        journal: DeviceJournal | None = None,
     ) -> None:
-        """Initialize."""
+        """Initialize.
+
+        Pass a `HedgePolicy` to enable hedged requests for `get_device` and
+        `get_devices`. Pass a `DeviceJournal` to record devices returned by
+        `get_device` and to start from their last-known state.
+        """
         self._username = username
         self._access_token = access_token
         self._id_token = id_token
         self._refresh_token = refresh_token
+        self._hedge_policy = hedge_policy
+        self._journal = journal
+        self._known_devices: dict[str, PentairDevice] = journal.latest() if journal is not None else {}
+
+    @property
+    def known_devices(self) -> dict[str, PentairDevice]:
+        """Return the last-known state of each device, keyed by deviceId."""
+        return dict(self._known_devices)
 
     @property
     def access_token(self) -> str | None:
@@ -172,9 +195,9 @@ class Pentair:
         """Logout of all clients (including app)."""
         self.get_user().logout()
 
-    def get_devices(self) -> List[PentairDevice]:
-        """Get devices."""
-        rawDevicesFromAPI = self.__get("device/device-service/user/devices")
+    def get_devices(self, timeout: float | None = None) -> List[PentairDevice]:
+        """Get devices, raising `requests.Timeout` if not done within `timeout` seconds."""
+        rawDevicesFromAPI = self.__get("device/device-service/user/devices", timeout=timeout, hedge=True)
         devices = []
         for item in rawDevicesFromAPI['data']:
             devices.append(
@@ -190,10 +213,21 @@ class Pentair:
             )
         return devices
     
-    def get_device(self, deviceId: str) -> PentairDevice:
-        """Get device."""
-        rawDeviceFromAPI = self.__get("device/device-service/user/device/" + deviceId)
-    
+    def get_device(self, deviceId: str, timeout: float | None = None) -> PentairDevice:
+        """Get device, raising `requests.Timeout` if not done within `timeout` seconds."""
+        device = self.__decode_device(
+            self.__get("device/device-service/user/device/" + deviceId, timeout=timeout, hedge=True)
+        )
+        self._known_devices[device.deviceId] = device
+        if self._journal is not None:
+            try:
+                self._journal.append(device)
+            except OSError as err:
+                _LOGGER.warning("Unable to record device in journal: %s", err)
+        return device
+
+    def __decode_device(self, rawDeviceFromAPI: Any) -> PentairDevice:
+        """Decode a device from an API response."""
         match rawDeviceFromAPI['data']['deviceType']:
             case "IF31":
                 activeProgramNumber = int(rawDeviceFromAPI['data']['fields']['s14']['value'])
@@ -283,10 +317,12 @@ class Pentair:
         """Update device."""
         return self.__put("device/device-service/user/device/" + deviceId, data)
 
-    def __request(self, method: str, url: str, data: Any = None, **kwargs: Any) -> Any:
+    def __request(self, method: str, url: str, data: Any = None, timeout: float | None = None, hedge: bool = False, **kwargs: Any) -> Any:
         """Make a request."""
         if (data == None):
             _LOGGER.debug("Making %s request to %s with %s", method, url, redact(kwargs))
+            # The deadline covers signing; a credential refresh is counted but not interrupted
+            deadline = monotonic() + (DEFAULT_GET_TIMEOUT if timeout is None else timeout)
             request = AWSRequest(
                 method=method,
                 url=urljoin(BASE_URL, url),
@@ -294,8 +330,9 @@ class Pentair:
             )
             self.get_auth().add_auth(request)
             prepped = request.prepare()
-            response = requests.request(
-                method, prepped.url, headers=prepped.headers, timeout=10, **kwargs
+            response = self.__send(
+                method, prepped.url, prepped.headers, deadline,
+                self._hedge_policy if hedge else None, **kwargs
             )
             json = response.json()
         else:
@@ -310,7 +347,8 @@ class Pentair:
             self.get_auth().add_auth(request)
             prepped = request.prepare()
             response = requests.request(
-                method, prepped.url, headers=prepped.headers, timeout=30, data=jsonData, **kwargs
+                method, prepped.url, headers=prepped.headers,
+                timeout=DEFAULT_PUT_TIMEOUT if timeout is None else timeout, data=jsonData, **kwargs
             )
             json = response.json()
         _LOGGER.debug(
@@ -321,6 +359,75 @@ class Pentair:
             response.raise_for_status()
         return json
 
+    def __send(
+        self, method: str, url: str, headers: Any, deadline: float, policy: HedgePolicy | None, **kwargs: Any
+    ) -> requests.Response:
+        """Send a request that must complete by `deadline`.
+
+        With a `policy`, a duplicate request is sent if the first one is slow,
+        and the first 2xx response wins. An error response is only returned if
+        no attempt succeeds in time.
+        """
+        start = monotonic()
+        if start >= deadline:
+            raise requests.exceptions.Timeout(f"Deadline passed before requesting {url}")
+
+        def send() -> Future[requests.Response]:
+            # A thread per attempt, so a stalled loser never delays a hedge
+            future: Future[requests.Response] = Future()
+
+            def run() -> None:
+                try:
+                    future.set_result(requests.request(
+                        method, url, headers=headers, timeout=max(deadline - monotonic(), 0.001), **kwargs
+                    ))
+                except Exception as err:  # pylint: disable=broad-except
+                    future.set_exception(err)
+
+            Thread(target=run, daemon=True).start()
+            return future
+
+        def record(future: Future[requests.Response]) -> None:
+            # Latency of the primary attempt, including ones that hit the deadline
+            exception = future.exception()
+            if policy is not None and (exception is None or isinstance(exception, requests.exceptions.Timeout)):
+                policy.record(monotonic() - start)
+
+        primary = send()
+        primary.add_done_callback(record)
+        pending = {primary}
+        delay = None if policy is None else policy.delay
+        hedge_at = None if delay is None else start + delay
+        hedged = False
+        fallback: requests.Response | None = None
+        error: BaseException | None = None
+        try:
+            while pending and (remaining := deadline - monotonic()) > 0:
+                if hedge_at is not None:
+                    remaining = min(remaining, max(hedge_at - monotonic(), 0))
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if (exception := future.exception()) is not None:
+                        error = exception
+                    elif (response := future.result()).ok:
+                        return response
+                    else:
+                        fallback = response
+                if pending and hedge_at is not None and monotonic() >= hedge_at:
+                    hedge_at = None
+                    if policy is not None and policy.acquire():
+                        _LOGGER.debug("Sending hedged %s request to %s after %.3fs", method, url, delay)
+                        pending.add(send())
+                        hedged = True
+        finally:
+            if policy is not None:
+                policy.complete(hedged)
+        if fallback is not None:
+            return fallback
+        if error is not None and not pending:
+            raise error
+        raise requests.exceptions.Timeout(f"No response from {url} before the deadline")
+
     def __get(self, url: str, **kwargs: Any) -> Any:
         """Make a get request."""
         return self.__request("get", url, **kwargs)
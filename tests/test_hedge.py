@@ -0,0 +1,175 @@
+"""Test hedged requests."""
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Any
+
+import pytest
+import requests
+
+from pypentair import HedgePolicy, Pentair
+
+from .common import SALT_SENSOR
+
+STALL_EVERY = 10
+STALL_SECONDS = 0.5
+REQUESTS = 60
+WARMUP = 5
+
+Respond = Callable[[int], "tuple[float, int]"]
+
+
+class _NoAuth:
+    """Stand-in for SigV4Auth."""
+
+    def add_auth(self, request: Any) -> None:
+        """Leave the request unsigned."""
+
+
+def _stall_every(request: int) -> tuple[float, int]:
+    """Stall every tenth request after the warmup."""
+    if request > WARMUP and request % STALL_EVERY == 0:
+        return STALL_SECONDS, 200
+    return 0, 200
+
+
+@pytest.fixture(name="serve")
+def serve_fixture(monkeypatch: pytest.MonkeyPatch) -> Iterator[Callable[[Respond], None]]:
+    """Start local stand-in servers, each counting its own requests."""
+    servers: list[ThreadingHTTPServer] = []
+    monkeypatch.setattr(Pentair, "get_auth", lambda self: _NoAuth())
+
+    def serve(respond: Respond) -> None:
+        counter = count(1)
+        lock = Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Respond with the device list."""
+                with lock:
+                    request = next(counter)
+                delay, status = respond(request)
+                sleep(delay)
+                body = json.dumps({"data": [SALT_SENSOR]}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up on this attempt
+
+            def log_message(self, *args: Any) -> None:
+                """Silence request logging."""
+
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        httpd.daemon_threads = True
+        Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        monkeypatch.setattr(
+            "pypentair.pentair.BASE_URL", f"http://127.0.0.1:{httpd.server_port}/"
+        )
+
+    yield serve
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _p99(pentair: Pentair) -> float:
+    """Return the p99 latency of `get_devices` calls after a warmup."""
+    for _ in range(WARMUP):
+        pentair.get_devices()
+    latencies = []
+    for _ in range(REQUESTS):
+        start = monotonic()
+        assert pentair.get_devices()[0].nickName == "Salt Level Sensor"
+        latencies.append(monotonic() - start)
+    return sorted(latencies)[int(len(latencies) * 0.99)]
+
+
+def test_hedge_policy() -> None:
+    """Test hedge delay and rate cap."""
+    policy = HedgePolicy(percentile=50, max_rate=0.2, min_samples=5, window=10)
+    assert policy.delay is None
+    for latency in (1, 2, 3, 4, 5):
+        policy.record(latency)
+        policy.complete(hedged=False)
+    assert policy.delay == 3
+    assert policy.acquire() is True
+    assert policy.acquire() is False
+    policy.complete(hedged=True)
+    assert policy.acquire() is False
+    for _ in range(4):
+        policy.complete(hedged=False)
+    assert policy.acquire() is True
+    policy.complete(hedged=False)
+
+    with pytest.raises(ValueError):
+        HedgePolicy(percentile=100)
+
+
+def test_complete_without_acquire() -> None:
+    """Test reporting a hedge that was never reserved does not loosen the cap."""
+    policy = HedgePolicy(max_rate=0.2, min_samples=1, window=5)
+    for _ in range(5):
+        policy.complete(hedged=True)
+    for _ in range(5):
+        policy.complete(hedged=False)
+    assert policy.acquire() is True
+    assert policy.acquire() is False
+
+
+def test_hedging_improves_p99(serve: Callable[[Respond], None]) -> None:
+    """Test hedging cuts tail latency against a server with injected stalls."""
+    serve(_stall_every)
+    plain = _p99(Pentair(id_token="token"))
+    serve(_stall_every)
+    hedged = _p99(
+        Pentair(
+            id_token="token",
+            hedge_policy=HedgePolicy(percentile=95, max_rate=0.25, min_samples=WARMUP),
+        )
+    )
+    assert plain >= STALL_SECONDS
+    assert hedged < STALL_SECONDS / 2
+
+
+def test_hedge_prefers_success(serve: Callable[[Respond], None]) -> None:
+    """Test a fast error response does not beat a slower success."""
+    serve(lambda request: (0.2, 200) if request == 1 else (0, 500))
+    policy = HedgePolicy(min_samples=1, max_rate=1)
+    policy.record(0.01)
+    policy.complete(hedged=False)
+    assert Pentair(id_token="token", hedge_policy=policy).get_devices()
+
+
+@pytest.mark.parametrize("policy", [None, HedgePolicy(max_rate=0)])
+def test_deadline(serve: Callable[[Respond], None], policy: HedgePolicy | None) -> None:
+    """Test a per-call timeout bounds a stalled request."""
+    serve(lambda request: (STALL_SECONDS, 200))
+    start = monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        Pentair(id_token="token", hedge_policy=policy).get_devices(timeout=0.1)
+    assert monotonic() - start < STALL_SECONDS
+
+
+def test_deadline_includes_signing(
+    serve: Callable[[Respond], None], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test time spent signing counts against the timeout."""
+    serve(lambda request: (0, 200))
+
+    def slow_auth(self: Pentair) -> _NoAuth:
+        sleep(0.2)
+        return _NoAuth()
+
+    monkeypatch.setattr(Pentair, "get_auth", slow_auth)
+    with pytest.raises(requests.exceptions.Timeout):
+        Pentair(id_token="token").get_devices(timeout=0.1)
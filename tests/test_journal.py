@@ -0,0 +1,315 @@
+"""Test device journal."""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from threading import Thread
+from typing import Any, BinaryIO
+
+import pytest
+
+from pypentair import (
+    DeviceJournal,
+    Pentair,
+    PentairIF3Pump,
+    PentairIF3PumpProgram,
+    PentairSaltLevelSensor,
+    PentairSumpPumpBatteryBackup,
+)
+
+from pypentair.journal import _write_record
+
+from .common import SALT_SENSOR
+
+NOW = datetime(2023, 7, 10, tzinfo=timezone.utc)
+
+
+def _salt_sensor(lastReport: datetime | int, saltLevel: int = 3) -> PentairSaltLevelSensor:
+    """Return a salt level sensor."""
+    return PentairSaltLevelSensor(
+        deviceId="salt",
+        nickName=SALT_SENSOR["productInfo"]["nickName"],
+        deviceType=SALT_SENSOR["deviceType"],
+        maker=SALT_SENSOR["productInfo"]["maker"],
+        model=SALT_SENSOR["productInfo"]["model"],
+        softwareVersion=SALT_SENSOR["currentFWVersion"],
+        lastReport=lastReport,
+        averageSaltUsagePerDay=3.51,
+        batteryLevel=0,
+        saltLevel=saltLevel,
+    )
+
+
+def _pump(lastReport: datetime) -> PentairIF3Pump:
+    """Return an IntelliFlo 3 pump."""
+    return PentairIF3Pump(
+        deviceId="pump",
+        nickName="Pool Pump",
+        deviceType="IF31",
+        maker="Pentair",
+        model="IF3",
+        softwareVersion="1.0",
+        lastReport=lastReport,
+        activeProgramNumber=1,
+        activeProgramName="Filter",
+        enabledPrograms=[PentairIF3PumpProgram(id=1, name="Filter")],
+        currentPowerConsumption=500,
+        currentMotorSpeed=150.0,
+        currentEstimatedFlow=40.5,
+    )
+
+
+def _sump_pump(lastReport: datetime) -> PentairSumpPumpBatteryBackup:
+    """Return a sump pump battery backup."""
+    return PentairSumpPumpBatteryBackup(
+        deviceId="sump",
+        nickName="Sump Pump",
+        deviceType="PPA0",
+        maker="Pentair",
+        model="PPA",
+        softwareVersion="1.0",
+        lastReport=lastReport,
+        batteryLevel=100,
+        lowBattery=False,
+        batteryCharging=False,
+        online=True,
+        power=True,
+        primaryPump=False,
+        secondaryPump=False,
+        waterLevel=False,
+    )
+
+
+def test_journal_round_trip(tmp_path: Path) -> None:
+    """Test snapshots survive reopening the journal."""
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path)
+    assert journal.latest() == {}
+    assert journal.append(_pump(NOW))
+    assert journal.append(_sump_pump(NOW))
+    assert journal.append(_salt_sensor(SALT_SENSOR["lastReport"]))
+    assert journal.append(_salt_sensor(SALT_SENSOR["lastReport"] + 60000, 2))
+    assert not journal.append(_salt_sensor(SALT_SENSOR["lastReport"]))
+
+    latest = DeviceJournal(path).latest()
+    assert set(latest) == {"pump", "sump", "salt"}
+    pump = latest["pump"]
+    assert isinstance(pump, PentairIF3Pump)
+    assert pump.lastReport == NOW
+    assert pump.enabledPrograms[0].name == "Filter"
+    assert isinstance(latest["sump"], PentairSumpPumpBatteryBackup)
+    salt = latest["salt"]
+    assert isinstance(salt, PentairSaltLevelSensor)
+    assert salt.saltLevel == 2
+    assert salt.lastReport == datetime.fromtimestamp(
+        SALT_SENSOR["lastReport"] / 1000 + 60, timezone.utc
+    )
+
+
+def test_journal_between(tmp_path: Path) -> None:
+    """Test time-range queries."""
+    journal = DeviceJournal(tmp_path / "devices.journal")
+    for minutes in range(5):
+        journal.append(_pump(NOW + timedelta(minutes=minutes)))
+        journal.append(_sump_pump(NOW + timedelta(minutes=minutes)))
+
+    snapshots = journal.between(
+        NOW + timedelta(minutes=1), NOW + timedelta(minutes=3), deviceId="pump"
+    )
+    assert [device.lastReport for device in snapshots] == [
+        NOW + timedelta(minutes=1),
+        NOW + timedelta(minutes=2),
+    ]
+    assert len(journal.between(NOW, NOW + timedelta(minutes=5))) == 10
+
+
+def test_journal_compaction(tmp_path: Path) -> None:
+    """Test compaction drops expired snapshots but keeps the latest."""
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path, compact_every=3, retention=timedelta(days=1))
+    for days in (30, 20, 10):
+        journal.append(_pump(datetime.now(timezone.utc) - timedelta(days=days)))
+    assert len(path.read_bytes().splitlines()) == 1
+    assert journal.get("pump") is not None
+
+    journal.append(_sump_pump(datetime.now(timezone.utc)))
+    with path.open("ab") as file:
+        file.write(b'{"type":"PentairIF3Pump","fie')
+    assert set(DeviceJournal(path).latest()) == {"pump", "sump"}
+
+
+def test_journal_append_after_torn_record(tmp_path: Path) -> None:
+    """Test a snapshot appended after a crash is not merged into the torn record."""
+    path = tmp_path / "devices.journal"
+    DeviceJournal(path).append(_pump(NOW))
+    with path.open("ab") as file:
+        file.write(b'{"type":"PentairIF3Pump","fie')
+
+    assert DeviceJournal(path).append(_pump(NOW + timedelta(minutes=1)))
+    pump = DeviceJournal(path).get("pump")
+    assert pump is not None
+    assert pump.lastReport == NOW + timedelta(minutes=1)
+
+
+def test_journal_compaction_skips_noop_rewrite(tmp_path: Path) -> None:
+    """Test compaction leaves the file alone when nothing would be dropped."""
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path, retention=None)
+    journal.append(_pump(NOW))
+    inode = path.stat().st_ino
+    journal.compact()
+    assert path.stat().st_ino == inode
+
+
+def test_journal_compaction_with_other_writer(tmp_path: Path) -> None:
+    """Test compaction does not lose snapshots appended by another writer."""
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path, retention=timedelta(days=1))
+    other = DeviceJournal(path, compact_every=0)
+    expired = datetime.now(timezone.utc) - timedelta(days=30)
+
+    def append_sump_pumps() -> None:
+        for minutes in range(200):
+            sump_pump = _sump_pump(NOW + timedelta(minutes=minutes))
+            sump_pump.deviceId = f"sump{minutes}"
+            other.append(sump_pump)
+
+    writer = Thread(target=append_sump_pumps)
+    writer.start()
+    for minutes in range(50):
+        journal.append(_pump(expired + timedelta(minutes=minutes)))
+        journal.compact()
+    writer.join()
+
+    latest = DeviceJournal(path).latest()
+    assert {f"sump{minutes}" for minutes in range(200)} <= set(latest)
+    assert latest["pump"].lastReport == expired + timedelta(minutes=49)
+
+
+def test_journal_open_does_not_modify_file(tmp_path: Path) -> None:
+    """Test opening skips an unterminated record without truncating it."""
+    path = tmp_path / "devices.journal"
+    DeviceJournal(path).append(_pump(NOW))
+    with path.open("ab") as file:
+        file.write(b'{"v":1,"type":"PentairIF3Pump","fie')
+    contents = path.read_bytes()
+    assert DeviceJournal(path).get("pump") is not None
+    assert path.read_bytes() == contents
+
+
+def test_journal_rejects_unknown_types(tmp_path: Path) -> None:
+    """Test only known device types are journaled, using constructor fields."""
+
+    class MyDevice(PentairSaltLevelSensor):
+        """Unknown device type."""
+
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path)
+    device = MyDevice(**{**vars(_salt_sensor(NOW)), "deviceId": "mine"})
+    with pytest.raises(TypeError):
+        journal.append(device)
+
+    salt = _salt_sensor(NOW)
+    salt.extra = "value"  # type: ignore[attr-defined]
+    assert journal.append(salt)
+    assert "extra" not in path.read_text()
+    assert set(DeviceJournal(path).latest()) == {"salt"}
+
+
+def test_journal_skips_undecodable_records(tmp_path: Path) -> None:
+    """Test a record that cannot be decoded falls back to an older snapshot."""
+    path = tmp_path / "devices.journal"
+    DeviceJournal(path).append(_pump(NOW))
+    records = [
+        {"v": 1, "type": "MyDevice", "fields": {"deviceId": "pump", "lastReport": NOW.timestamp() + 60}},
+        {"v": 1, "type": "PentairIF3Pump", "fields": {"deviceId": "pump", "lastReport": NOW.timestamp() + 120}},
+        {"v": 2, "type": "PentairIF3Pump", "fields": {"deviceId": "pump", "lastReport": NOW.timestamp() + 180}},
+    ]
+    with path.open("a") as file:
+        file.writelines(json.dumps(record) + "\n" for record in records)
+
+    journal = DeviceJournal(path)
+    pump = journal.get("pump")
+    assert pump is not None
+    assert pump.lastReport == NOW
+    assert len(journal.between(NOW, NOW + timedelta(days=1))) == 1
+
+
+class _FullDisk:
+    """File wrapper whose writes fail part-way."""
+
+    def __init__(self, file: BinaryIO) -> None:
+        """Initialize."""
+        self._file = file
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate to the wrapped file."""
+        return getattr(self._file, name)
+
+    def write(self, data: bytes) -> int:
+        """Write half of the data, then fail."""
+        self._file.write(data[: len(data) // 2])
+        self._file.flush()
+        raise OSError("No space left on device")
+
+
+def test_journal_failed_write_is_rolled_back(tmp_path: Path) -> None:
+    """Test a partial write does not corrupt the next record."""
+    path = tmp_path / "devices.journal"
+    journal = DeviceJournal(path)
+    journal.append(_pump(NOW))
+    contents = path.read_bytes()
+    with path.open("a+b") as file, pytest.raises(OSError):
+        _write_record(_FullDisk(file), contents)  # type: ignore[arg-type]
+    assert path.read_bytes() == contents
+
+    assert journal.append(_pump(NOW + timedelta(minutes=1)))
+    pump = DeviceJournal(path).get("pump")
+    assert pump is not None
+    assert pump.lastReport == NOW + timedelta(minutes=1)
+
+
+def test_client_hydrates_from_journal(tmp_path: Path) -> None:
+    """Test the client starts from the journal's last-known state."""
+    journal = DeviceJournal(tmp_path / "devices.journal")
+    journal.append(_pump(NOW))
+    pentair = Pentair(journal=DeviceJournal(journal.path))
+    assert pentair.known_devices["pump"].lastReport == NOW
+    assert Pentair().known_devices == {}
+
+
+def test_client_ignores_journal_errors(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a journal write failure does not fail a successful fetch."""
+    fields: dict[str, Any] = {
+        "s14": {"value": "0"},
+        "s18": {"value": "500"},
+        "s19": {"value": "1500"},
+        "s26": {"value": "405"},
+    }
+    for program in range(1, 9):
+        fields[f"zp{program}e2"] = {"value": f"Program {program}"}
+        fields[f"zp{program}e13"] = {"value": "1" if program == 1 else "0"}
+    response = {
+        "data": {
+            "deviceId": "pump",
+            "deviceType": "IF31",
+            "productInfo": {"nickName": "Pool Pump", "maker": "Pentair", "model": "IF3"},
+            "fwVersion": "1.0",
+            "timestamp": NOW.timestamp(),
+            "fields": fields,
+        }
+    }
+    journal = DeviceJournal(tmp_path / "devices.journal")
+
+    def fail(device: Any) -> bool:
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(journal, "append", fail)
+    pentair = Pentair(journal=journal)
+    monkeypatch.setattr(pentair, "_Pentair__get", lambda *args, **kwargs: response)
+    pump = pentair.get_device("pump")
+    assert isinstance(pump, PentairIF3Pump)
+    assert pentair.known_devices["pump"] is pump